@@ -3,47 +3,245 @@
 Cerebras Cloud inference client - fast LLM workhorse.
 """
 
-import argparse
 import asyncio
-import json
+import contextlib
+import functools
+import hashlib
 import os
+import pathlib
 import sys
 from typing import AsyncIterator, Optional
 
 try:
-    import aiohttp
+    import h2  # noqa: F401  (HTTP/2 support for httpx)
+    import httpx
+    import msgspec
+    import orjson
 except ImportError:
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "aiohttp", "-q"])
-    import aiohttp
+    raise SystemExit("Install dependencies: pip install 'httpx[http2]' msgspec orjson")
+
+# Seconds between stdout flushes when streaming to the terminal
+_FLUSH_INTERVAL = 0.05
+
+# Completions at or below this temperature are eligible for caching
+_CACHE_MAX_TEMPERATURE = 0.3
+
+# SSE line markers
+_DATA = b"data: "
+_DONE = b"data: [DONE]"
+
+
+# Typed view of a streamed chunk: decodes straight into slotted objects
+class _Delta(msgspec.Struct):
+    content: Optional[str] = None
+
+
+class _Choice(msgspec.Struct):
+    delta: _Delta = msgspec.field(default_factory=_Delta)
+
+
+class _Chunk(msgspec.Struct):
+    choices: list[_Choice] = []
+    error: Optional[dict] = None
+
+
+_CHUNK_DECODER = msgspec.json.Decoder(_Chunk)
+
+
+async def _read_ahead(resp: httpx.Response, queue: asyncio.Queue):
+    """Pump body chunks into ``queue``, then ``None`` (or the read error)."""
+    try:
+        async for chunk in resp.aiter_bytes():
+            await queue.put(chunk)
+    except Exception as e:
+        await queue.put(e)
+    else:
+        await queue.put(None)
+
 
 # Configuration
+@functools.lru_cache(maxsize=1)
 def get_config():
     """Load config from env or file."""
     config = {
         "api_key": os.getenv("OPENROUTER_API_KEY") or os.getenv("CEREBRAS_API_KEY"),
         "model": os.getenv("CEREBRAS_MODEL", os.getenv("OR_CEREBRAS_MODEL", "qwen/qwen3-235b-a22b")),
         "base_url": "https://openrouter.ai/api/v1",
+        "cache": os.getenv("CEREBRAS_CACHE", "").lower() in ("1", "true", "yes"),
     }
     
     # Try config file
-    config_path = os.path.expanduser("~/.config/cerebras/config")
-    if os.path.exists(config_path):
-        with open(config_path) as f:
-            for line in f:
-                line = line.strip()
-                if "=" in line and not line.startswith("#"):
-                    key, value = line.split("=", 1)
-                    key = key.strip().lower()
-                    value = value.strip().strip('"\'')
-                    if key == "cerebras_api_key" and not config["api_key"]:
-                        config["api_key"] = value
-                    elif key == "cerebras_model":
-                        config["model"] = value
+    config_path = pathlib.Path("~/.config/cerebras/config").expanduser()
+    try:
+        text = config_path.read_text()
+    except FileNotFoundError:
+        return config
+    
+    for line in text.splitlines():
+        key, sep, value = line.partition("=")
+        key = key.strip().lower()
+        if not sep or key.startswith("#"):
+            continue
+        value = value.strip().strip('"\'')
+        if key == "cerebras_api_key" and not config["api_key"]:
+            config["api_key"] = value
+        elif key == "cerebras_model":
+            config["model"] = value
+        elif key == "cerebras_cache" and "CEREBRAS_CACHE" not in os.environ:
+            config["cache"] = value.lower() in ("1", "true", "yes")
     
     return config
 
 
+@functools.lru_cache(maxsize=16)
+def _code_system(language: str) -> str:
+    """System prompt for code(); invariant per language."""
+    return f"""You are an expert {language} programmer. 
+Output only code, no explanations unless asked.
+Follow best practices and include error handling."""
+
+
+class _Cache:
+    """Exact-match on-disk cache of completion results."""
+    
+    def __init__(self, directory: str = "~/.cache/cerebras"):
+        import diskcache
+        self._store = diskcache.Cache(os.path.expanduser(directory))
+    
+    @staticmethod
+    def key(model: str, messages: list[dict], temperature: float, max_tokens: int) -> str:
+        return hashlib.blake2b(orjson.dumps({
+            "m": model,
+            "msgs": messages,
+            "t": temperature,
+            "mx": max_tokens,
+        })).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        return self._store.get(key)
+    
+    def set(self, key: str, value: str):
+        self._store.set(key, value)
+    
+    def close(self):
+        self._store.close()
+
+
+class _SemanticCache:
+    """Nearest-neighbour cache of completions keyed by prompt embedding.
+    
+    Entries are written to the shared diskcache store as they are added,
+    under ids from a cross-process counter. New vectors are merged into
+    ``index.bin`` on ``close()``, under a lock, so processes sharing the
+    directory do not overwrite each other's additions.
+    """
+    
+    def __init__(
+        self,
+        directory: str = "~/.cache/cerebras/semantic",
+        threshold: float = 0.95,
+        embedding_model: str = "BAAI/bge-small-en-v1.5",
+    ):
+        import diskcache
+        from fastembed import TextEmbedding
+        
+        path = pathlib.Path(directory).expanduser()
+        self._store = diskcache.Cache(str(path))
+        self._lock = diskcache.Lock(self._store, "index-lock")
+        self._embedder = TextEmbedding(embedding_model)
+        self._threshold = threshold
+        
+        self._index_path = str(path / "index.bin")
+        self._dim = len(next(iter(self._embedder.embed([""]))))
+        self._index = self._load_index()
+        self._new_items = []  # (id, vector) pairs not yet merged into index.bin
+    
+    def _load_index(self):
+        import hnswlib
+        index = hnswlib.Index(space="cosine", dim=self._dim)
+        if os.path.exists(self._index_path):
+            index.load_index(self._index_path)
+        else:
+            index.init_index(max_elements=1024)
+        return index
+    
+    @staticmethod
+    def _insert(index, item_id: int, vec):
+        if index.get_current_count() >= index.get_max_elements():
+            index.resize_index(2 * index.get_max_elements())
+        index.add_items(vec, [item_id])
+    
+    @staticmethod
+    def _similarity(a, b) -> float:
+        import numpy as np
+        return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+    
+    def embed(self, text: str):
+        """Embed ``text``; CPU-bound, so async callers run it in a thread.
+        
+        Returns None when ``text`` is longer than the embedder reads: it
+        truncates silently, so prompts that differ only past the cut-off
+        (e.g. a long ``code()`` context followed by the task) would share
+        a vector.
+        """
+        tokenizer = getattr(getattr(self._embedder, "model", None), "tokenizer", None)
+        if tokenizer is None or tokenizer.encode(text).overflowing:
+            return None
+        return next(iter(self._embedder.embed([text])))
+    
+    def lookup(self, vec, system: Optional[str], model: str, max_tokens: int) -> Optional[str]:
+        """Return cached content for a close enough prompt, or None on a miss.
+        
+        The index is shared across system prompts and models, so the nearest
+        neighbour may belong to another one; the first few are checked.
+        """
+        count = self._index.get_current_count()
+        if not count:
+            return None
+        labels, distances = self._index.knn_query(vec, k=min(8, count))
+        for label, distance in zip(labels[0], distances[0]):
+            if 1 - distance < self._threshold:
+                break
+            entry = self._store.get(int(label))
+            if (
+                entry
+                and entry["system"] == system
+                and entry["model"] == model
+                and entry.get("max_tokens") == max_tokens
+                and entry.get("vec") is not None
+                and self._similarity(vec, entry["vec"]) >= self._threshold
+            ):
+                return entry["content"]
+        return None
+    
+    def add(self, vec, system: Optional[str], model: str, max_tokens: int, content: str):
+        item_id = self._store.incr("next_id")
+        self._store.set(item_id, {
+            "vec": vec,
+            "system": system,
+            "model": model,
+            "max_tokens": max_tokens,
+            "content": content,
+        })
+        self._insert(self._index, item_id, vec)
+        self._new_items.append((item_id, vec))
+    
+    def close(self):
+        if self._new_items:
+            # Re-read the index under the lock so vectors other processes
+            # saved since we loaded it are kept, then swap the file in atomically.
+            with self._lock:
+                index = self._load_index()
+                for item_id, vec in self._new_items:
+                    self._insert(index, item_id, vec)
+                tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+                index.save_index(tmp_path)
+                os.replace(tmp_path, self._index_path)
+            self._index = index
+            self._new_items.clear()
+        self._store.close()
+
+
 class CerebrasClient:
     """Async client for Cerebras Cloud inference."""
     
@@ -55,21 +253,92 @@ class CerebrasClient:
         "gpt-oss-120b": "gpt-oss-120b",  # OpenAI's open model
     }
     
-    def __init__(self, api_key: str = None, model: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        model: str = None,
+        cache: bool = None,
+        semantic_cache: bool = False,
+        max_concurrency: int = 16,
+    ):
         config = get_config()
         self.api_key = api_key or config["api_key"]
         self.model = model or config["model"]
         self.base_url = config["base_url"]
+        self.max_concurrency = max_concurrency
+        if cache is None:
+            cache = config["cache"]
         
         if not self.api_key:
             raise ValueError("CEREBRAS_API_KEY not set. Export it or add to ~/.config/cerebras/config")
-    
-    @property
-    def headers(self):
-        return {
+        
+        self._headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
+            "Accept": "text/event-stream, application/json",
         }
+        self._session: Optional[httpx.AsyncClient] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cache: Optional[_Cache] = _Cache() if cache else None
+        self._semantic_cache: Optional[_SemanticCache] = _SemanticCache() if semantic_cache else None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.aclose()
+    
+    async def _get_session(self) -> httpx.AsyncClient:
+        """Return the shared HTTP/2 session, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        if self._session is not None and self._session_loop is not loop:
+            # Pooled connections belong to the loop that opened them (usually
+            # an earlier, now closed, asyncio.run()); they cannot be reused here.
+            self._session = None
+        if self._session is None or self._session.is_closed:
+            self._session_loop = loop
+            self._session = httpx.AsyncClient(
+                http2=True,
+                headers=self._headers,
+                base_url=self.base_url,
+                timeout=httpx.Timeout(60.0, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=32,
+                    # httpx drops idle connections after 5s by default; hold them
+                    # long enough that agent loops with pauses skip the TLS redo.
+                    keepalive_expiry=75.0,
+                ),
+            )
+        return self._session
+    
+    async def aclose(self):
+        """Close the shared session and its pooled connections."""
+        if self._session is not None:
+            await self._session.aclose()
+            self._session = None
+        if self._cache is not None:
+            self._cache.close()
+        if self._semantic_cache is not None:
+            self._semantic_cache.close()
+    
+    def _build_payload(
+        self,
+        messages: list[dict],
+        max_tokens: int,
+        temperature: float,
+        stream: bool = False,
+    ) -> bytes:
+        """Serialize a chat completion request body."""
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+        if stream:
+            payload["stream"] = True
+        return orjson.dumps(payload)
     
     async def complete(
         self,
@@ -84,7 +353,46 @@ class CerebrasClient:
             messages.append({"role": "system", "content": system})
         messages.append({"role": "user", "content": prompt})
         
-        return await self.chat(messages, max_tokens, temperature)
+        vec = None
+        if self._semantic_cache is not None and temperature <= _CACHE_MAX_TEMPERATURE:
+            vec = await asyncio.to_thread(self._semantic_cache.embed, prompt)
+            if vec is not None:
+                cached = self._semantic_cache.lookup(vec, system, self.model, max_tokens)
+                if cached is not None:
+                    return cached
+        
+        content = await self.chat(messages, max_tokens, temperature)
+        if vec is not None:
+            self._semantic_cache.add(vec, system, self.model, max_tokens, content)
+        return content
+    
+    async def complete_many(
+        self,
+        prompts: list[str],
+        system: str = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        return_exceptions: bool = False,
+    ) -> list:
+        """Run completions concurrently over the shared session, in prompt order.
+        
+        On the first failure the remaining requests are cancelled, unless
+        ``return_exceptions`` is set, in which case errors are returned in
+        place of their results.
+        """
+        sem = asyncio.Semaphore(self.max_concurrency)
+        
+        async def _one(prompt: str) -> str:
+            async with sem:
+                return await self.complete(prompt, system, max_tokens, temperature)
+        
+        tasks = [asyncio.create_task(_one(p)) for p in prompts]
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
     
     async def chat(
         self,
@@ -93,23 +401,26 @@ class CerebrasClient:
         temperature: float = 0.7,
     ) -> str:
         """Chat completion."""
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "max_tokens": max_tokens,
-                    "temperature": temperature,
-                }
-            ) as resp:
-                if resp.status != 200:
-                    error = await resp.text()
-                    raise Exception(f"Cerebras API error {resp.status}: {error}")
-                
-                data = await resp.json()
-                return data["choices"][0]["message"]["content"]
+        key = None
+        if self._cache is not None and temperature <= _CACHE_MAX_TEMPERATURE:
+            key = _Cache.key(self.model, messages, temperature, max_tokens)
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+        
+        session = await self._get_session()
+        resp = await session.post(
+            "/chat/completions",
+            content=self._build_payload(messages, max_tokens, temperature),
+        )
+        if resp.status_code != 200:
+            raise Exception(f"Cerebras API error {resp.status_code}: {resp.text}")
+        
+        data = orjson.loads(resp.content)
+        content = data["choices"][0]["message"]["content"]
+        if key is not None:
+            self._cache.set(key, content)
+        return content
     
     async def stream(
         self,
@@ -124,32 +435,63 @@ class CerebrasClient:
             messages.append({"role": "system", "content": system})
         messages.append({"role": "user", "content": prompt})
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "max_tokens": max_tokens,
-                    "temperature": temperature,
-                    "stream": True,
-                }
-            ) as resp:
-                if resp.status != 200:
-                    error = await resp.text()
-                    raise Exception(f"Cerebras API error {resp.status}: {error}")
-                
-                async for line in resp.content:
-                    line = line.decode().strip()
-                    if line.startswith("data: ") and line != "data: [DONE]":
-                        try:
-                            data = json.loads(line[6:])
-                            delta = data["choices"][0].get("delta", {})
-                            if "content" in delta:
-                                yield delta["content"]
-                        except json.JSONDecodeError:
-                            continue
+        session = await self._get_session()
+        async with session.stream(
+            "POST",
+            "/chat/completions",
+            content=self._build_payload(messages, max_tokens, temperature, stream=True),
+        ) as resp:
+            if resp.status_code != 200:
+                error = (await resp.aread()).decode(errors="replace")
+                raise Exception(f"Cerebras API error {resp.status_code}: {error}")
+            
+            # A reader task keeps pulling body chunks into a bounded queue
+            # while the parser below works through earlier ones. Both run on
+            # the event loop thread; the queue only hands bytes between them.
+            queue: asyncio.Queue = asyncio.Queue(maxsize=16)
+            reader = asyncio.create_task(_read_ahead(resp, queue))
+            try:
+                # Frame SSE events ourselves: one read can carry many tokens.
+                # CRLF and bare CR line endings are folded to LF first; a
+                # trailing CR is held back in case its LF is in the next read.
+                buf = bytearray()
+                held_cr = False
+                while True:
+                    chunk = await queue.get()
+                    if chunk is None:
+                        # Close a final event the server did not end with a blank line.
+                        buf += b"\n\n"
+                    elif isinstance(chunk, Exception):
+                        raise chunk
+                    else:
+                        if held_cr:
+                            chunk = b"\r" + chunk
+                        held_cr = chunk.endswith(b"\r")
+                        if held_cr:
+                            chunk = chunk[:-1]
+                        buf += chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+                    while (i := buf.find(b"\n\n")) != -1:
+                        event = bytes(buf[:i])
+                        del buf[:i + 2]
+                        for line in event.splitlines():
+                            if line[:6] != _DATA:
+                                continue
+                            if line == _DONE:
+                                return
+                            payload = line[6:]
+                            if payload[:1] != b"{":
+                                continue
+                            frame = _CHUNK_DECODER.decode(payload)
+                            if frame.error is not None:
+                                raise Exception(f"Cerebras API error: {frame.error}")
+                            if frame.choices and frame.choices[0].delta.content:
+                                yield frame.choices[0].delta.content
+                    if chunk is None:
+                        break
+            finally:
+                reader.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await reader
     
     async def code(
         self,
@@ -158,9 +500,7 @@ class CerebrasClient:
         language: str = "python",
     ) -> str:
         """Code generation with coding-optimized prompt."""
-        system = f"""You are an expert {language} programmer. 
-Output only code, no explanations unless asked.
-Follow best practices and include error handling."""
+        system = _code_system(language)
         
         prompt = task
         if context:
@@ -180,9 +520,34 @@ PRESETS = {
 }
 
 
+@functools.lru_cache(maxsize=16)
+def _preset_prompt(name: str, target_lang: str) -> str:
+    """Render a preset, filling in the target language where it takes one."""
+    prompt = PRESETS[name]
+    if "{target_lang}" in prompt:
+        prompt = prompt.format(target_lang=target_lang)
+    return prompt
+
+
 async def main():
+    import argparse
+    
     parser = argparse.ArgumentParser(description="Cerebras inference client")
     parser.add_argument("--model", default=None, help="Model to use")
+    parser.add_argument(
+        "--cache",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Cache low-temperature completions on disk; applies to code and "
+        "preset, not complete or chat (default: CEREBRAS_CACHE)",
+    )
+    parser.add_argument(
+        "--semantic-cache",
+        action="store_true",
+        help="Reuse cached completions for similarly worded prompts "
+        "(like --cache, only applies at temperature <= 0.3: code and preset, "
+        "not complete or chat)",
+    )
     
     subparsers = parser.add_subparsers(dest="command", required=True)
     
@@ -210,43 +575,88 @@ async def main():
     preset.add_argument("--context", required=True, help="Code to process")
     preset.add_argument("--target-lang", help="Target language (for translate)")
     
+    # Bulk
+    bulk = subparsers.add_parser("bulk", help="Run many prompts concurrently")
+    bulk.add_argument("--file", required=True, help="File with one prompt per line")
+    bulk.add_argument("--system", help="System prompt")
+    
     args = parser.parse_args()
     
     try:
-        client = CerebrasClient(model=args.model)
-    except ValueError as e:
+        client = CerebrasClient(
+            model=args.model,
+            cache=args.cache,
+            semantic_cache=args.semantic_cache,
+        )
+    except (ValueError, ImportError) as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
     
-    if args.command == "complete":
-        if args.stream:
-            async for chunk in client.stream(args.prompt, system=args.system):
-                print(chunk, end="", flush=True)
-            print()
-        else:
-            result = await client.complete(args.prompt, system=args.system)
+    async with client:
+        if args.command == "complete":
+            if args.stream:
+                out = sys.stdout.buffer
+                loop = asyncio.get_running_loop()
+                pending_flush = None
+                
+                def flush():
+                    nonlocal pending_flush
+                    pending_flush = None
+                    out.flush()
+                
+                # Batch writes, but never hold text back longer than one
+                # interval even if the model pauses mid-stream.
+                try:
+                    async for chunk in client.stream(args.prompt, system=args.system):
+                        out.write(chunk.encode("utf-8"))
+                        if pending_flush is None:
+                            pending_flush = loop.call_later(_FLUSH_INTERVAL, flush)
+                finally:
+                    if pending_flush is not None:
+                        pending_flush.cancel()
+                    out.write(b"\n")
+                    out.flush()
+            else:
+                result = await client.complete(args.prompt, system=args.system)
+                print(result)
+    
+        elif args.command == "code":
+            result = await client.code(args.task, context=args.context, language=args.language)
             print(result)
     
-    elif args.command == "code":
-        result = await client.code(args.task, context=args.context, language=args.language)
-        print(result)
+        elif args.command == "chat":
+            prompt = args.message
+            if args.context:
+                prompt = f"Context:\n{args.context}\n\n{args.message}"
+            result = await client.complete(prompt, system=args.system)
+            print(result)
     
-    elif args.command == "chat":
-        prompt = args.message
-        if args.context:
-            prompt = f"Context:\n{args.context}\n\n{args.message}"
-        result = await client.complete(prompt, system=args.system)
-        print(result)
+        elif args.command == "preset":
+            preset_prompt = _preset_prompt(args.name, args.target_lang or "TypeScript")
+            prompt = f"{preset_prompt}\n\n```\n{args.context}\n```"
+            result = await client.complete(prompt, temperature=0.3)
+            print(result)
     
-    elif args.command == "preset":
-        preset_prompt = PRESETS[args.name]
-        if "{target_lang}" in preset_prompt:
-            preset_prompt = preset_prompt.format(target_lang=args.target_lang or "TypeScript")
-        
-        prompt = f"{preset_prompt}\n\n```\n{args.context}\n```"
-        result = await client.complete(prompt, temperature=0.3)
-        print(result)
+        elif args.command == "bulk":
+            with open(args.file) as f:
+                prompts = [line.strip() for line in f if line.strip()]
+            results = await client.complete_many(prompts, system=args.system, return_exceptions=True)
+            for prompt, result in zip(prompts, results):
+                if isinstance(result, Exception):
+                    line = {"prompt": prompt, "error": str(result)}
+                else:
+                    line = {"prompt": prompt, "result": result}
+                print(orjson.dumps(line).decode())
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        if sys.version_info >= (3, 12):
+            asyncio.run(main(), loop_factory=uvloop.new_event_loop)
+        else:
+            uvloop.install()
+            asyncio.run(main())